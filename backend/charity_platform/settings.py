@@ -67,6 +67,26 @@ DATABASES = {
     }
 }
 
+# Cache (Redis when REDIS_URL is configured, local memory otherwise)
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -124,6 +144,9 @@ CORS_ALLOW_CREDENTIALS = True
 PINATA_API_KEY = config('PINATA_API_KEY', default='')
 PINATA_SECRET_API_KEY = config('PINATA_SECRET_API_KEY', default='')
 
+# Path to libhashtree for batched Merkle hashing (found on the library path if empty)
+HASHTREE_LIBRARY = config('HASHTREE_LIBRARY', default='')
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
\ No newline at end of file
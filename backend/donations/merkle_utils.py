@@ -4,190 +4,647 @@ Merkle Tree Implementation for Donation Verification
 """
 
 import hashlib
-import json
+import logging
+import struct
+from datetime import datetime
+from decimal import Decimal
 from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
-from .models import Donation
+from dataclasses import asdict, dataclass
+from functools import cached_property
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from .models import CharityMerkleLayer, Donation, DonationEpoch, MerkleTreeCache
+from .merkle_hashing import DIGEST_SIZE, PAIR_SIZE, build_levels, hash_leaves, hash_pair, hash_pairs
+
+logger = logging.getLogger(__name__)
+
+# Cached trees and proofs are keyed by donation count and last id, so any
+# worker sees a new donation without an explicit invalidation
+MERKLE_CACHE_TIMEOUT = 3600
+PROOF_CACHE_TIMEOUT = 86400
+
+# Donation columns a leaf is built from, read with values_list
+DONATION_LEAF_FIELDS = ('id', 'donor_address', 'amount', 'created_at', 'tx_hash')
+DonationRow = Tuple[int, str, Decimal, datetime, str]
+DONATION_LEAF_ORDER = ('created_at', 'id')
+
+# Packed leaf: leaf tag, donor address, tx hash, amount in 1e-8 units,
+# unix timestamp. The tag and the 73-byte length keep a leaf from ever
+# hashing like a 64-byte node pair
+LEAF_TAG = 0
+DONATION_LEAF_STRUCT = struct.Struct('<B20s32s16sI')
+
+# max_digits=20 with 8 decimal places stays below 2**67, so a signed
+# 16-byte amount can't overflow
+AMOUNT_SCALE = 10 ** 8
+AMOUNT_SIZE = 16
+
+# Donations per sealed epoch. A power of two, so each epoch root is exactly
+# the full tree's node EPOCH_DEPTH levels above the leaves
+EPOCH_SIZE = 1024
+EPOCH_DEPTH = EPOCH_SIZE.bit_length() - 1
+
+# Levels below the root persisted in CharityMerkleLayer; verification against
+# it skips that many hashes per proof
+MERKLE_CACHED_LAYER_DEPTH = 4
+
+# Bump whenever leaf or node hashing changes so stored trees get rebuilt
+MERKLE_TREE_VERSION = 5
 
 @dataclass
 class MerkleProof:
-    proof: List[str]
+    proof: List[Optional[str]]  # None where the node was promoted without a sibling
     leaf: str
     root: str
     index: int
 
-class MerkleNode:
-    def __init__(self, hash_value: str, left=None, right=None, data=None):
-        self.hash = hash_value
-        self.left = left
-        self.right = right
-        self.data = data
-
 class MerkleTree:
     def __init__(self, data: List[str]):
         if not data:
             raise ValueError("Cannot build tree with empty data")
         
-        self.leaves = [self._hash(item) for item in data]
-        self.tree = []
-        self.root = None
+        # One contiguous buffer of 32-byte digests per level, leaves first
+        self.levels = [self._hash_leaves(data)]
         self._build_tree()
     
-    def _hash(self, data: str) -> str:
-        """Create SHA-256 hash of data"""
-        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+    @classmethod
+    def from_levels(cls, levels: List[bytearray]) -> 'MerkleTree':
+        """Wrap already built levels without rehashing"""
+        merkle_tree = cls.__new__(cls)
+        merkle_tree.levels = levels
+        return merkle_tree
+    
+    @staticmethod
+    def split_levels(nodes: bytes, leaf_count: int) -> List[bytearray]:
+        """Split every level stored back to back, leaves first, into separate buffers"""
+        levels = []
+        offset = 0
+        width = leaf_count
+        while True:
+            levels.append(bytearray(nodes[offset:offset + width * DIGEST_SIZE]))
+            if width == 1:
+                return levels
+            offset += width * DIGEST_SIZE
+            width = (width + 1) // 2
+    
+    @staticmethod
+    def _leaf_bytes(data: str) -> bytes:
+        """Bytes a leaf is hashed from"""
+        return data.encode('utf-8')
+    
+    @classmethod
+    def _hash_leaves(cls, data: List) -> bytearray:
+        """Hash every leaf, returning the digests back to back"""
+        # Encode everything up front so leaf hashing is one tight loop
+        return hash_leaves([cls._leaf_bytes(item) for item in data])
+    
+    def _hash(self, data) -> bytes:
+        """Create SHA-256 digest of a leaf"""
+        return hashlib.sha256(self._leaf_bytes(data)).digest()
+    
+    @property
+    def leaf_count(self) -> int:
+        return len(self.levels[0]) // DIGEST_SIZE
+    
+    def _node(self, level: int, index: int) -> bytearray:
+        """Get the digest at a position in a level"""
+        offset = index * DIGEST_SIZE
+        return self.levels[level][offset:offset + DIGEST_SIZE]
     
     def _build_tree(self):
         """Build the complete Merkle Tree bottom-up"""
-        # Start with leaf nodes
-        current_level = [
-            MerkleNode(leaf, data=f"leaf_{i}") 
-            for i, leaf in enumerate(self.leaves)
-        ]
-        
-        self.tree.append(current_level[:])
+        # Every level is hashed in one batched call per level
+        self.levels = build_levels(self.levels[0])
+    
+    def append_leaf(self, data):
+        """Append a leaf and rehash only the path from it to the root"""
+        self.__dict__.pop('tree_info', None)
+        self.levels[0] += self._hash(data)
         
-        # Build tree level by level
-        while len(current_level) > 1:
-            next_level = []
-            
-            # Process pairs of nodes
-            for i in range(0, len(current_level), 2):
-                left = current_level[i]
-                right = current_level[i + 1] if i + 1 < len(current_level) else left
-                
-                # Combine hashes
-                combined_hash = self._hash(left.hash + right.hash)
-                parent_node = MerkleNode(
-                    combined_hash,
-                    left=left,
-                    right=right if right != left else None
-                )
-                
-                next_level.append(parent_node)
+        # Siblings off the right spine keep their hashes untouched
+        level = 0
+        index = self.leaf_count - 1
+        while len(self.levels[level]) > DIGEST_SIZE:
+            left_index = index - index % 2
+            right_index = left_index + 1
+            if right_index * DIGEST_SIZE < len(self.levels[level]):
+                parent_hash = hash_pair(self._node(level, left_index), self._node(level, right_index))
+            else:
+                # Unpaired last node moves up unchanged
+                parent_hash = self._node(level, left_index)
             
-            self.tree.append(next_level[:])
-            current_level = next_level
+            if level + 1 == len(self.levels):
+                self.levels.append(bytearray())
+            index = index // 2
+            offset = index * DIGEST_SIZE
+            self.levels[level + 1][offset:offset + DIGEST_SIZE] = parent_hash
+            level += 1
+    
+    @staticmethod
+    def compute_root_only(leaves: bytearray) -> bytes:
+        """Compute the root of back to back leaf digests without keeping any level
+        
+        Each level's digests overwrite the front of one working buffer, so
+        memory stays at the leaves plus a single level of digests.
+        """
+        if not leaves:
+            raise ValueError("Cannot build tree with empty data")
         
-        self.root = current_level[0]
+        nodes = bytearray(leaves)
+        while len(nodes) > DIGEST_SIZE:
+            parents = hash_pairs(nodes)
+            if len(nodes) % PAIR_SIZE:
+                # Unpaired last node moves up unchanged
+                parents += nodes[-DIGEST_SIZE:]
+            nodes[:len(parents)] = parents
+            del nodes[len(parents):]
+        return bytes(nodes)
     
     def get_root_hash(self) -> str:
-        """Get the root hash of the tree"""
-        if not self.root:
+        """Get the hex root hash of the tree"""
+        if len(self.levels[-1]) != DIGEST_SIZE:
             raise ValueError("Tree not built")
-        return self.root.hash
+        return self.levels[-1].hex()
     
     def generate_proof(self, leaf_index: int) -> MerkleProof:
         """Generate Merkle proof for a specific leaf"""
-        if leaf_index < 0 or leaf_index >= len(self.leaves):
+        if leaf_index < 0 or leaf_index >= self.leaf_count:
             raise ValueError("Invalid leaf index")
         
         proof = []
         current_index = leaf_index
         
         # Traverse from leaf to root, collecting sibling hashes
-        for level in range(len(self.tree) - 1):
-            current_level = self.tree[level]
-            is_right_node = current_index % 2 == 1
-            
-            if is_right_node:
-                # Current node is right, sibling is left
-                sibling_index = current_index - 1
-                if sibling_index >= 0:
-                    proof.append(current_level[sibling_index].hash)
+        for level in range(len(self.levels) - 1):
+            sibling_index = current_index ^ 1
+            if sibling_index * DIGEST_SIZE < len(self.levels[level]):
+                proof.append(self._node(level, sibling_index).hex())
             else:
-                # Current node is left, sibling is right
-                sibling_index = current_index + 1
-                if sibling_index < len(current_level):
-                    proof.append(current_level[sibling_index].hash)
+                # Promoted node, nothing to hash at this level
+                proof.append(None)
             
             # Move to parent level
             current_index = current_index // 2
         
         return MerkleProof(
             proof=proof,
-            leaf=self.leaves[leaf_index],
+            leaf=self._node(0, leaf_index).hex(),
             root=self.get_root_hash(),
             index=leaf_index
         )
     
     @staticmethod
-    def verify_proof(merkle_proof: MerkleProof) -> bool:
-        """Verify a Merkle proof"""
-        computed_hash = merkle_proof.leaf
+    def verify_proof(
+        merkle_proof: MerkleProof,
+        leaf_count: int,
+        expected_node: Optional[str] = None,
+        stop_level: Optional[int] = None
+    ) -> bool:
+        """Verify a Merkle proof of a tree with leaf_count leaves, against the root or a known node at stop_level"""
+        computed_hash = bytes.fromhex(merkle_proof.leaf)
         current_index = merkle_proof.index
         
-        # Recreate path to root using the proof
-        for sibling_hash in merkle_proof.proof:
+        # The leaf count fixes the tree's shape: one proof entry per level
+        # below the root, and which levels have a sibling at this index
+        proof_path = merkle_proof.proof
+        if not 0 <= current_index < leaf_count or len(proof_path) != (leaf_count - 1).bit_length():
+            return False
+        if stop_level is not None:
+            proof_path = proof_path[:stop_level]
+        
+        # Recreate path to root (or stop_level) using the proof
+        level_width = leaf_count
+        for sibling_hex in proof_path:
+            has_sibling = current_index ^ 1 < level_width
+            level_width = (level_width + 1) // 2
+            
+            if sibling_hex is None:
+                # Only an unpaired last node is promoted to the next level unchanged
+                if has_sibling:
+                    return False
+                current_index = current_index // 2
+                continue
+            if not has_sibling:
+                return False
+            
+            sibling_hash = bytes.fromhex(sibling_hex)
             is_right_node = current_index % 2 == 1
             
             if is_right_node:
                 # Current node is right, sibling is left
-                combined = sibling_hash + computed_hash
+                computed_hash = hash_pair(sibling_hash, computed_hash)
             else:
                 # Current node is left, sibling is right
-                combined = computed_hash + sibling_hash
+                computed_hash = hash_pair(computed_hash, sibling_hash)
             
-            computed_hash = hashlib.sha256(combined.encode('utf-8')).hexdigest()
             current_index = current_index // 2
         
-        return computed_hash == merkle_proof.root
+        if stop_level is not None:
+            return computed_hash == bytes.fromhex(expected_node)
+        return computed_hash == bytes.fromhex(merkle_proof.root)
     
-    def get_tree_info(self) -> Dict:
-        """Get tree information for debugging"""
+    @cached_property
+    def tree_info(self) -> Dict:
+        """Tree information for debugging, computed once per tree"""
         return {
-            'total_leaves': len(self.leaves),
-            'tree_depth': len(self.tree),
+            'total_leaves': self.leaf_count,
+            'tree_depth': len(self.levels),
             'root_hash': self.get_root_hash(),
-            'leaves': self.leaves[:5]  # First 5 leaves for preview
+            'leaves': [self._node(0, i).hex() for i in range(min(5, self.leaf_count))]  # First 5 leaves for preview
         }
+    
+    def get_tree_info(self) -> Dict:
+        """Get tree information for debugging"""
+        return self.tree_info
 
 class DonationMerkleTree(MerkleTree):
     """Specialized Merkle Tree for donation verification"""
     
-    def __init__(self, donations: List[Donation]):
-        # Create standardized donation strings
-        donation_strings = []
-        for donation in donations:
-            donation_str = f"{donation.id}:{donation.donor_address}:{donation.amount}:{int(donation.created_at.timestamp())}:{donation.tx_hash}"
-            donation_strings.append(donation_str)
-        
-        super().__init__(donation_strings)
+    def __init__(self, donations: List[DonationRow]):
+        super().__init__(donations)
         self.donations = donations
+        self.donation_ids = [donation[0] for donation in donations]
+        self._index_by_id = {donation_id: i for i, donation_id in enumerate(self.donation_ids)}
+        self.created_at = donations[0][3].isoformat() if donations else None
+    
+    @staticmethod
+    def _donation_row(donation: Donation) -> DonationRow:
+        return tuple(getattr(donation, field) for field in DONATION_LEAF_FIELDS)
+    
+    @staticmethod
+    def _hex_field(value: str, size: int) -> bytes:
+        """Decode a 0x-prefixed hex field to exactly size bytes"""
+        try:
+            decoded = bytes.fromhex(value[2:] if value.startswith('0x') else value)
+        except ValueError:
+            decoded = b''
+        if len(decoded) == size:
+            return decoded
+        # Malformed values are still bound into the leaf, through their digest
+        return hashlib.sha256(value.encode('utf-8')).digest()[:size]
+    
+    @staticmethod
+    def _leaf_bytes(donation: DonationRow) -> bytes:
+        """Packed, tagged encoding a donation leaf is hashed from"""
+        _, donor_address, amount, created_at, tx_hash = donation
+        # tx_hash is unique, so the leaf identifies the donation without its id
+        return DONATION_LEAF_STRUCT.pack(
+            LEAF_TAG,
+            DonationMerkleTree._hex_field(donor_address, 20),
+            DonationMerkleTree._hex_field(tx_hash, 32),
+            int(amount * AMOUNT_SCALE).to_bytes(AMOUNT_SIZE, 'little', signed=True),
+            int(created_at.timestamp())
+        )
+    
+    def append_donation(self, donation: DonationRow):
+        """Append a new donation as the rightmost leaf"""
+        self.append_leaf(donation)
+        if self.donations is not None:
+            self.donations.append(donation)
+        self._index_by_id[donation[0]] = len(self.donation_ids)
+        self.donation_ids.append(donation[0])
     
     def generate_donation_proof(self, donation_id: int) -> Optional[MerkleProof]:
         """Generate proof for a specific donation"""
-        try:
-            donation_index = next(
-                i for i, donation in enumerate(self.donations) 
-                if donation.id == donation_id
-            )
-            return self.generate_proof(donation_index)
-        except StopIteration:
+        donation_index = self._index_by_id.get(donation_id)
+        if donation_index is None:
             return None
+        return self.generate_proof(donation_index)
     
     def get_donation_hash(self, donation: Donation) -> str:
-        """Get standardized hash for a donation"""
-        donation_str = f"{donation.id}:{donation.donor_address}:{donation.amount}:{int(donation.created_at.timestamp())}:{donation.tx_hash}"
-        return self._hash(donation_str)
+        """Get standardized hex hash for a donation"""
+        return self._hash(self._donation_row(donation)).hex()
+    
+    def to_cache(self) -> Dict:
+        """Serialize the tree levels and donation index for caching"""
+        return {
+            'nodes': b''.join(self.levels),
+            'donation_ids': self.donation_ids,
+            'created_at': self.created_at
+        }
+
+class CachedDonationMerkleTree(DonationMerkleTree):
+    """Donation Merkle Tree rehydrated from cached levels without rehashing"""
+    
+    def __init__(self, nodes: bytes, donation_ids: List[int], created_at: Optional[str]):
+        self.levels = self.split_levels(nodes, len(donation_ids))
+        self.donations = None
+        self.donation_ids = donation_ids
+        self._index_by_id = {donation_id: i for i, donation_id in enumerate(self.donation_ids)}
+        self.created_at = created_at
+    
+    @classmethod
+    def from_cache(cls, cached: Dict) -> 'CachedDonationMerkleTree':
+        return cls(**cached)
+    
+    @classmethod
+    def from_stored(cls, stored: MerkleTreeCache) -> 'CachedDonationMerkleTree':
+        return cls(
+            bytes(stored.nodes),
+            stored.donation_ids,
+            stored.first_donation_at.isoformat() if stored.first_donation_at else None
+        )
 
 # Utility functions
+def _merkle_cache_key(charity_id: int, donation_count: int, last_donation_id: int) -> str:
+    return f"merkle:{charity_id}:{donation_count}:{last_donation_id}:v{MERKLE_TREE_VERSION}"
+
+def _merkle_info_cache_key(charity_id: int, donation_count: int, last_donation_id: int) -> str:
+    return f"merkle-info:{charity_id}:{donation_count}:{last_donation_id}:v{MERKLE_TREE_VERSION}"
+
+def _proof_cache_key(charity_id: int, donation_count: int, last_donation_id: int, donation_id: int) -> str:
+    return f"proof:{charity_id}:{donation_count}:{last_donation_id}:v{MERKLE_TREE_VERSION}:{donation_id}"
+
 def create_charity_merkle_tree(charity_id: int) -> Optional[DonationMerkleTree]:
     """Create Merkle tree for all donations to a charity"""
     try:
         from .models import Donation
-        donations = list(Donation.objects.filter(
+        confirmed = Donation.objects.filter(charity_id=charity_id, confirmed=True)
+        stats = confirmed.aggregate(count=Count('id'), last_id=Max('id'))
+        
+        if not stats['count']:
+            return None
+        
+        cache_key = _merkle_cache_key(charity_id, stats['count'], stats['last_id'])
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return CachedDonationMerkleTree.from_cache(cached)
+        
+        # Fall back to the persisted tree while it covers every confirmed donation
+        stored = MerkleTreeCache.objects.filter(charity_id=charity_id).first()
+        if (stored and stored.version == MERKLE_TREE_VERSION
+                and len(stored.donation_ids) == stats['count']
+                and stored.donation_ids[-1] == stats['last_id']):
+            merkle_tree = CachedDonationMerkleTree.from_stored(stored)
+        else:
+            donations = list(confirmed.order_by(*DONATION_LEAF_ORDER).values_list(*DONATION_LEAF_FIELDS))
+            if not donations:
+                return None
+            
+            merkle_tree = DonationMerkleTree(donations)
+            _store_merkle_tree(charity_id, merkle_tree)
+        
+        cache.set(cache_key, merkle_tree.to_cache(), MERKLE_CACHE_TIMEOUT)
+        return merkle_tree
+    except Exception:
+        logger.exception("Error creating Merkle tree for charity %s", charity_id)
+        return None
+
+def _store_merkle_tree(charity_id: int, merkle_tree: DonationMerkleTree):
+    MerkleTreeCache.objects.update_or_create(
+        charity_id=charity_id,
+        defaults={
+            'nodes': b''.join(merkle_tree.levels),
+            'donation_ids': merkle_tree.donation_ids,
+            'first_donation_at': merkle_tree.created_at,
+            'version': MERKLE_TREE_VERSION
+        }
+    )
+    
+    level = max(len(merkle_tree.levels) - 1 - MERKLE_CACHED_LAYER_DEPTH, 0)
+    CharityMerkleLayer.objects.update_or_create(
+        charity_id=charity_id,
+        defaults={
+            'level': level,
+            'nodes': bytes(merkle_tree.levels[level]),
+            'root_hash': merkle_tree.get_root_hash(),
+            'tree_depth': len(merkle_tree.levels),
+            'leaf_count': merkle_tree.leaf_count,
+            'last_donation_id': max(merkle_tree.donation_ids),
+            'version': MERKLE_TREE_VERSION
+        }
+    )
+
+def _fresh_merkle_layer(charity_id: int, stats: Optional[Dict] = None) -> Optional[CharityMerkleLayer]:
+    """The persisted layer, or None when it doesn't cover exactly the confirmed donations"""
+    layer = CharityMerkleLayer.objects.filter(charity_id=charity_id, version=MERKLE_TREE_VERSION).first()
+    if not layer:
+        return None
+    
+    # Same staleness check as the cached trees: count and last id
+    if stats is None:
+        stats = Donation.objects.filter(
             charity_id=charity_id,
             confirmed=True
-        ).order_by('created_at'))
+        ).aggregate(count=Count('id'), last_id=Max('id'))
+    if layer.leaf_count != stats['count'] or layer.last_donation_id != stats['last_id']:
+        return None
+    return layer
+
+def _verify_against_cached_layer(charity_id: int, proof: MerkleProof) -> Optional[Dict]:
+    """Verify a proof up to the persisted layer, or None when the layer is stale"""
+    layer = _fresh_merkle_layer(charity_id)
+    if not layer:
+        return None
+    
+    nodes = bytes(layer.nodes)
+    offset = (proof.index >> layer.level) * DIGEST_SIZE
+    is_valid_proof = (
+        0 <= proof.index < layer.leaf_count
+        and len(proof.proof) == layer.tree_depth - 1
+        and MerkleTree.verify_proof(proof, layer.leaf_count, nodes[offset:offset + DIGEST_SIZE].hex(), layer.level)
+    )
+    root_matches = proof.root == layer.root_hash
+    
+    return {
+        'verified': is_valid_proof and root_matches,
+        'proof_valid': is_valid_proof,
+        'root_matches': root_matches,
+        'current_root': layer.root_hash,
+        'provided_root': proof.root,
+        'tree_info': {
+            'total_leaves': layer.leaf_count,
+            'tree_depth': layer.tree_depth,
+            'root_hash': layer.root_hash,
+            'verified_to_level': layer.level
+        }
+    }
+
+def append_donation_to_merkle_tree(donation: Donation):
+    """Update the persisted charity tree after a donation is confirmed"""
+    try:
+        # Read the row back so the leaf matches what a full rebuild sees
+        donation_row = Donation.objects.filter(id=donation.id).values_list(*DONATION_LEAF_FIELDS).get()
         
-        if not donations:
-            return None
+        # Only the hashing is incremental: the stored levels are still read and
+        # written whole, so the row is locked to keep concurrent donations from
+        # overwriting each other's append
+        with transaction.atomic():
+            stored = MerkleTreeCache.objects.select_for_update().filter(charity_id=donation.charity_id).first()
+            previous_count = Donation.objects.filter(
+                charity_id=donation.charity_id,
+                confirmed=True
+            ).exclude(id=donation.id).count()
+            
+            if (stored and stored.version == MERKLE_TREE_VERSION
+                    and len(stored.donation_ids) == previous_count and previous_count > 0):
+                merkle_tree = CachedDonationMerkleTree.from_stored(stored)
+                merkle_tree.append_donation(donation_row)
+            else:
+                # Missing or out of sync with the donations table, rebuild from scratch
+                merkle_tree = DonationMerkleTree(list(
+                    _confirmed_donations(donation.charity_id).values_list(*DONATION_LEAF_FIELDS)
+                ))
+            
+            _store_merkle_tree(donation.charity_id, merkle_tree)
         
-        return DonationMerkleTree(donations)
-    except Exception as e:
-        print(f"Error creating Merkle tree: {e}")
+        if merkle_tree.leaf_count % EPOCH_SIZE == 0:
+            # This donation filled an epoch; precompute its tree once committed
+            charity_id = donation.charity_id
+            epoch_index = merkle_tree.leaf_count // EPOCH_SIZE - 1
+            transaction.on_commit(lambda: seal_epoch(charity_id, epoch_index))
+    except Exception:
+        logger.exception("Error updating Merkle tree for charity %s", donation.charity_id)
+
+def _confirmed_donations(charity_id: int):
+    """Confirmed donations of a charity in leaf order"""
+    return Donation.objects.filter(
+        charity_id=charity_id,
+        confirmed=True
+    ).order_by(*DONATION_LEAF_ORDER)
+
+def seal_epoch(charity_id: int, epoch_index: int) -> Optional[DonationEpoch]:
+    """Precompute and store the tree for one full epoch of donations"""
+    start = epoch_index * EPOCH_SIZE
+    donations = list(
+        _confirmed_donations(charity_id).values_list(*DONATION_LEAF_FIELDS)[start:start + EPOCH_SIZE]
+    )
+    if len(donations) < EPOCH_SIZE:
         return None
+    
+    merkle_tree = DonationMerkleTree(donations)
+    epoch, _ = DonationEpoch.objects.update_or_create(
+        charity_id=charity_id,
+        epoch_index=epoch_index,
+        defaults={
+            'root': merkle_tree.get_root_hash(),
+            'nodes': b''.join(merkle_tree.levels),
+            'donation_ids': merkle_tree.donation_ids,
+            'version': MERKLE_TREE_VERSION
+        }
+    )
+    return epoch
+
+def _epoch_roots(charity_id: int, sealed_count: int) -> List[str]:
+    """Roots of the first sealed_count epochs, sealing any that are missing or stale"""
+    sealed_ids = list(
+        _confirmed_donations(charity_id).values_list('id', flat=True)[:sealed_count * EPOCH_SIZE]
+    )
+    epochs = DonationEpoch.objects.filter(
+        charity_id=charity_id,
+        epoch_index__lt=sealed_count,
+        version=MERKLE_TREE_VERSION
+    ).values_list('epoch_index', 'root', 'donation_ids')
+    
+    # A delete or an out of order insert shifts which donations an epoch
+    # covers, so a sealed epoch is only trusted while its ids still match
+    roots = {}
+    for epoch_index, root, donation_ids in epochs:
+        start = epoch_index * EPOCH_SIZE
+        if donation_ids == sealed_ids[start:start + EPOCH_SIZE]:
+            roots[epoch_index] = root
+    
+    for epoch_index in range(sealed_count):
+        if epoch_index not in roots:
+            roots[epoch_index] = seal_epoch(charity_id, epoch_index).root
+    
+    return [roots[epoch_index] for epoch_index in range(sealed_count)]
+
+def _open_epoch_tree(charity_id: int, sealed_count: int, total: int) -> MerkleTree:
+    """Tree of the epoch still filling up, cut from the charity's cached tree when it's current"""
+    start = sealed_count * EPOCH_SIZE
+    merkle_tree = create_charity_merkle_tree(charity_id)
+    if merkle_tree is None or merkle_tree.leaf_count != total:
+        return DonationMerkleTree(list(
+            _confirmed_donations(charity_id).values_list(*DONATION_LEAF_FIELDS)[start:]
+        ))
+    
+    # The open epoch starts on an epoch boundary, so up to its root its
+    # subtree is the tail of each full tree level
+    levels = []
+    for level, nodes in enumerate(merkle_tree.levels):
+        levels.append(nodes[(start >> level) * DIGEST_SIZE:])
+        if len(levels[-1]) == DIGEST_SIZE:
+            break
+    return MerkleTree.from_levels(levels)
+
+def _generate_epoch_proof(charity_id: int, donation_id: int, total: int) -> Dict:
+    """Build a donation's proof from its epoch's tree plus the tree of epoch roots"""
+    confirmed = _confirmed_donations(charity_id)
+    created_at = confirmed.filter(id=donation_id).values_list('created_at', flat=True).first()
+    if created_at is None:
+        return {'error': 'Donation not found in Merkle tree'}
+    
+    position = confirmed.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=donation_id)
+    ).count()
+    epoch_index, local_index = divmod(position, EPOCH_SIZE)
+    sealed_count = total // EPOCH_SIZE
+    roots = _epoch_roots(charity_id, sealed_count)
+    
+    open_tree = None
+    if total > sealed_count * EPOCH_SIZE:
+        # The open epoch holds fewer than EPOCH_SIZE donations
+        open_tree = _open_epoch_tree(charity_id, sealed_count, total)
+        roots.append(open_tree.get_root_hash())
+    
+    if epoch_index < sealed_count:
+        # Only this epoch's precomputed levels are read
+        epoch = DonationEpoch.objects.get(charity_id=charity_id, epoch_index=epoch_index)
+        epoch_tree = MerkleTree.from_levels(MerkleTree.split_levels(bytes(epoch.nodes), EPOCH_SIZE))
+    else:
+        epoch_tree = open_tree
+    
+    proof = epoch_tree.generate_proof(local_index)
+    proof.index = position
+    tree_depth = len(epoch_tree.levels)
+    
+    if len(roots) > 1:
+        # A partial epoch's root is promoted unchanged up to the epoch level
+        proof.proof += [None] * (EPOCH_DEPTH - len(proof.proof))
+        
+        top_tree = MerkleTree.from_levels(build_levels(bytearray.fromhex(''.join(roots))))
+        top_proof = top_tree.generate_proof(epoch_index)
+        proof.proof += top_proof.proof
+        proof.root = top_proof.root
+        tree_depth = EPOCH_DEPTH + len(top_tree.levels)
+    
+    return {
+        'merkle_proof': asdict(proof),
+        'tree_info': {
+            'total_leaves': total,
+            'tree_depth': tree_depth,
+            'root_hash': proof.root,
+            'epoch': epoch_index
+        }
+    }
+
+def get_donation_leaf_preview(charity_id: int) -> List[str]:
+    """Hex hashes of a charity's first 5 leaves, for debugging"""
+    preview = DonationMerkleTree._hash_leaves(
+        list(_confirmed_donations(charity_id).values_list(*DONATION_LEAF_FIELDS)[:5])
+    )
+    return [preview[offset:offset + DIGEST_SIZE].hex() for offset in range(0, len(preview), DIGEST_SIZE)]
+
+def get_donation_proof(charity_id: int, donation_id: int) -> Dict:
+    """Get a donation's Merkle proof and tree info, cached until the charity's tree changes"""
+    stats = Donation.objects.filter(
+        charity_id=charity_id,
+        confirmed=True
+    ).aggregate(count=Count('id'), last_id=Max('id'))
+    if not stats['count']:
+        return {'error': 'No confirmed donations found for this charity'}
+    
+    cache_key = _proof_cache_key(charity_id, stats['count'], stats['last_id'], donation_id)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    result = _generate_epoch_proof(charity_id, donation_id, stats['count'])
+    if 'error' not in result:
+        cache.set(cache_key, result, PROOF_CACHE_TIMEOUT)
+    return result
 
 def verify_donation_inclusion(
    
@@ -196,6 +653,19 @@ def verify_donation_inclusion(
 ) -> Dict:
     """Verify if a donation is included in charity's Merkle tree"""
     try:
+        # Create proof object
+        proof = MerkleProof(
+            proof=provided_proof['proof'],
+            leaf=provided_proof['leaf'],
+            root=provided_proof['root'],
+            index=provided_proof['index']
+        )
+        
+        # Prefer the persisted layer over rebuilding the tree
+        layer_result = _verify_against_cached_layer(charity_id, proof)
+        if layer_result is not None:
+            return layer_result
+        
         # Create current Merkle tree
         merkle_tree = create_charity_merkle_tree(charity_id)
         if not merkle_tree:
@@ -207,16 +677,8 @@ def verify_donation_inclusion(
         # Get current root hash
         current_root = merkle_tree.get_root_hash()
         
-        # Create proof object
-        proof = MerkleProof(
-            proof=provided_proof['proof'],
-            leaf=provided_proof['leaf'],
-            root=provided_proof['root'],
-            index=provided_proof['index']
-        )
-        
         # Verify proof structure
-        is_valid_proof = MerkleTree.verify_proof(proof)
+        is_valid_proof = MerkleTree.verify_proof(proof, merkle_tree.leaf_count)
         
         # Check if root matches current tree
         root_matches = proof.root == current_root
@@ -239,15 +701,40 @@ def verify_donation_inclusion(
 def get_donation_merkle_info(charity_id: int) -> Dict:
     """Get Merkle tree information for a charity"""
     try:
-        merkle_tree = create_charity_merkle_tree(charity_id)
-        if not merkle_tree:
+        confirmed = _confirmed_donations(charity_id)
+        stats = confirmed.aggregate(count=Count('id'), last_id=Max('id'))
+        total = stats['count']
+        if not total:
             return {'error': 'No donations found'}
         
-        return {
-            'root_hash': merkle_tree.get_root_hash(),
-            'total_donations': len(merkle_tree.donations),
-            'tree_depth': len(merkle_tree.tree),
-            'created_at': merkle_tree.donations[0].created_at.isoformat() if merkle_tree.donations else None
+        cache_key = _merkle_info_cache_key(charity_id, total, stats['last_id'])
+        merkle_info = cache.get(cache_key)
+        if merkle_info is not None:
+            return merkle_info
+        
+        # The persisted layer carries the root, refreshed on every recorded donation
+        layer = _fresh_merkle_layer(charity_id, stats)
+        if layer:
+            root_hash = layer.root_hash
+        else:
+            # Only the root is needed: sealed epochs contribute their stored
+            # roots and just the open epoch's leaves are hashed
+            sealed_count = total // EPOCH_SIZE
+            roots = bytearray.fromhex(''.join(_epoch_roots(charity_id, sealed_count)))
+            if total > sealed_count * EPOCH_SIZE:
+                roots += MerkleTree.compute_root_only(DonationMerkleTree._hash_leaves(
+                    list(confirmed.values_list(*DONATION_LEAF_FIELDS)[sealed_count * EPOCH_SIZE:])
+                ))
+            root_hash = MerkleTree.compute_root_only(roots).hex()
+        
+        merkle_info = {
+            'root_hash': root_hash,
+            'total_donations': total,
+            # With promotion, depth depends only on the leaf count
+            'tree_depth': (total - 1).bit_length() + 1,
+            'created_at': confirmed.values_list('created_at', flat=True).first().isoformat()
         }
+        cache.set(cache_key, merkle_info, MERKLE_CACHE_TIMEOUT)
+        return merkle_info
     except Exception as e:
         return {'error': str(e)}         
\ No newline at end of file
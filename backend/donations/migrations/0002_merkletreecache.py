@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-15 04:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charities', '0002_charity_on_chain_id'),
+        ('donations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MerkleTreeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('levels', models.JSONField(default=list)),
+                ('donation_ids', models.JSONField(default=list)),
+                ('first_donation_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('charity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='merkle_tree_cache', to='charities.charity')),
+            ],
+            options={
+                'db_table': 'merkle_tree_cache',
+            },
+        ),
+    ]
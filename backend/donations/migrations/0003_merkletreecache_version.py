@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0002_merkletreecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merkletreecache',
+            name='version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-15 04:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charities', '0002_charity_on_chain_id'),
+        ('donations', '0003_merkletreecache_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharityMerkleLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('nodes', models.BinaryField()),
+                ('root_hash', models.CharField(max_length=64)),
+                ('tree_depth', models.PositiveSmallIntegerField()),
+                ('leaf_count', models.PositiveIntegerField()),
+                ('version', models.PositiveSmallIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('charity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='merkle_layer', to='charities.charity')),
+            ],
+            options={
+                'db_table': 'charity_merkle_layers',
+            },
+        ),
+    ]
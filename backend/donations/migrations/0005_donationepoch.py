@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-15 04:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charities', '0002_charity_on_chain_id'),
+        ('donations', '0004_charitymerklelayer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch_index', models.PositiveIntegerField()),
+                ('root', models.CharField(max_length=64)),
+                ('nodes', models.BinaryField()),
+                ('donation_ids', models.JSONField(default=list)),
+                ('version', models.PositiveSmallIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('charity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='donation_epochs', to='charities.charity')),
+            ],
+            options={
+                'db_table': 'donation_epochs',
+                'unique_together': {('charity', 'epoch_index')},
+            },
+        ),
+    ]
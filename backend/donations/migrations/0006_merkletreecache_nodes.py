@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-15 04:30
+
+from django.db import migrations, models
+
+
+def clear_stored_trees(apps, schema_editor):
+    # Stored trees lose their levels here; they are rebuilt on the next read
+    apps.get_model('donations', 'MerkleTreeCache').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0005_donationepoch'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_stored_trees, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='merkletreecache',
+            name='levels',
+        ),
+        migrations.AddField(
+            model_name='merkletreecache',
+            name='nodes',
+            field=models.BinaryField(default=bytes),
+        ),
+    ]
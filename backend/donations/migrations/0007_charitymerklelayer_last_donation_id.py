@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0006_merkletreecache_nodes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charitymerklelayer',
+            name='last_donation_id',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
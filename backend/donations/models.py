@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from charities.models import Charity
 
 class Donation(models.Model):
@@ -16,12 +17,68 @@ class Donation(models.Model):
         return f"{self.amount} ETH to {self.charity.name}"
     
     def save(self, *args, **kwargs):
-        # Update charity raised amount when donation is confirmed
-        if self.confirmed and not self.pk:
-            self.charity.raised_amount += self.amount
-            self.charity.save()
-        super().save(*args, **kwargs)
+        # Update charity raised amount when donation is confirmed, as a single
+        # UPDATE so concurrent donations can't overwrite each other's totals
+        is_new_confirmed = self.confirmed and not self.pk
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new_confirmed:
+                Charity.objects.filter(id=self.charity_id).update(
+                    raised_amount=F('raised_amount') + self.amount
+                )
     
     class Meta:
         db_table = 'donations'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class MerkleTreeCache(models.Model):
+    """Persisted Merkle tree levels for a charity's confirmed donations"""
+    charity = models.OneToOneField(Charity, on_delete=models.CASCADE, related_name='merkle_tree_cache')
+    nodes = models.BinaryField(default=bytes)  # 32-byte digests of every level back to back, leaves first
+    donation_ids = models.JSONField(default=list)  # Donation id for each leaf
+    first_donation_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveSmallIntegerField(default=1)  # Hashing scheme the levels were built with
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Merkle tree for {self.charity.name} ({len(self.donation_ids)} leaves)"
+    
+    class Meta:
+        db_table = 'merkle_tree_cache'
+
+
+class CharityMerkleLayer(models.Model):
+    """Intermediate Merkle tree level cached so proofs can be verified without the full tree"""
+    charity = models.OneToOneField(Charity, on_delete=models.CASCADE, related_name='merkle_layer')
+    level = models.PositiveSmallIntegerField()  # Counted up from the leaves
+    nodes = models.BinaryField()  # 32-byte digests of the level, back to back
+    root_hash = models.CharField(max_length=64)
+    tree_depth = models.PositiveSmallIntegerField()
+    leaf_count = models.PositiveIntegerField()
+    last_donation_id = models.PositiveIntegerField(null=True)  # With leaf_count, detects a delete followed by an insert
+    version = models.PositiveSmallIntegerField(default=1)  # Hashing scheme the nodes were built with
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Merkle layer {self.level} for {self.charity.name}"
+    
+    class Meta:
+        db_table = 'charity_merkle_layers'
+
+
+class DonationEpoch(models.Model):
+    """Sealed Merkle tree over one fixed-size run of a charity's confirmed donations"""
+    charity = models.ForeignKey(Charity, on_delete=models.CASCADE, related_name='donation_epochs')
+    epoch_index = models.PositiveIntegerField()
+    root = models.CharField(max_length=64)
+    nodes = models.BinaryField()  # 32-byte digests of every level back to back, leaves first
+    donation_ids = models.JSONField(default=list)  # Donation id for each leaf
+    version = models.PositiveSmallIntegerField(default=1)  # Hashing scheme the nodes were built with
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Epoch {self.epoch_index} for {self.charity.name}"
+    
+    class Meta:
+        db_table = 'donation_epochs'
+        unique_together = ['charity', 'epoch_index']
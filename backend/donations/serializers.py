@@ -18,4 +18,7 @@ class DonationCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Donation
-        fields = ['charity_id', 'donor_address', 'amount', 'tx_hash']
\ No newline at end of file
+        fields = ['charity_id', 'donor_address', 'amount', 'tx_hash']
+        # Duplicates are caught by the database constraint in record_donation
+        # rather than an extra lookup query here
+        extra_kwargs = {'tx_hash': {'validators': []}}
\ No newline at end of file
@@ -0,0 +1,312 @@
+import hashlib
+from dataclasses import asdict
+from decimal import Decimal
+from unittest import mock, skipIf
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from charities.models import Charity
+from users.models import UserProfile
+from . import merkle_hashing, merkle_utils
+from .merkle_utils import (
+    DONATION_LEAF_FIELDS,
+    DonationMerkleTree,
+    MerkleProof,
+    MerkleTree,
+    get_donation_merkle_info,
+    get_donation_proof,
+    verify_donation_inclusion
+)
+from .models import Donation
+
+
+def sha256(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+class MerkleTreeTests(SimpleTestCase):
+    def test_unpaired_node_is_promoted(self):
+        merkle_tree = MerkleTree(['a', 'b', 'c'])
+        leaves = [merkle_tree._node(0, i) for i in range(3)]
+
+        self.assertEqual(merkle_tree._node(1, 1), leaves[2])
+        self.assertEqual(merkle_tree.get_root_hash(), sha256(sha256(leaves[0] + leaves[1]) + leaves[2]).hex())
+
+        proof = merkle_tree.generate_proof(2)
+        self.assertEqual(proof.proof, [None, sha256(leaves[0] + leaves[1]).hex()])
+        self.assertTrue(MerkleTree.verify_proof(proof, 3))
+
+    def test_duplicated_last_leaf_changes_root(self):
+        self.assertNotEqual(
+            MerkleTree(['a', 'b', 'c']).get_root_hash(),
+            MerkleTree(['a', 'b', 'c', 'c']).get_root_hash()
+        )
+
+    def test_every_proof_verifies(self):
+        for count in range(1, 18):
+            merkle_tree = MerkleTree([str(i) for i in range(count)])
+            for index in range(count):
+                proof = merkle_tree.generate_proof(index)
+                self.assertTrue(MerkleTree.verify_proof(proof, count), (count, index))
+
+                tampered = MerkleProof(proof.proof, sha256(b'other').hex(), proof.root, index)
+                self.assertFalse(MerkleTree.verify_proof(tampered, count), (count, index))
+
+    def test_promotion_only_where_no_sibling_exists(self):
+        merkle_tree = MerkleTree([str(i) for i in range(6)])
+        level = 1
+        # Claim an internal node is a leaf, skipping levels that have siblings
+        forged = MerkleProof(
+            [None] * level + merkle_tree.generate_proof(2).proof[level:],
+            merkle_tree._node(level, 1).hex(),
+            merkle_tree.get_root_hash(),
+            1 << level
+        )
+        self.assertFalse(MerkleTree.verify_proof(forged, 6))
+
+        proof = merkle_tree.generate_proof(0)
+        self.assertFalse(MerkleTree.verify_proof(MerkleProof(proof.proof[:-1], proof.leaf, proof.root, 0), 6))
+
+        # Leaf 5 is promoted at level 1 with 6 leaves but has a sibling with 7
+        proof = merkle_tree.generate_proof(5)
+        self.assertTrue(MerkleTree.verify_proof(proof, 6))
+        self.assertFalse(MerkleTree.verify_proof(proof, 7))
+
+    def test_append_leaf_matches_rebuild(self):
+        data = [str(i) for i in range(33)]
+        merkle_tree = MerkleTree(data[:1])
+        for count in range(2, len(data) + 1):
+            merkle_tree.append_leaf(data[count - 1])
+            self.assertEqual(merkle_tree.levels, MerkleTree(data[:count]).levels, count)
+
+    def test_compute_root_only_matches_tree(self):
+        for count in range(1, 40):
+            merkle_tree = MerkleTree([str(i) for i in range(count)])
+            root = MerkleTree.compute_root_only(merkle_tree.levels[0])
+            self.assertEqual(root.hex(), merkle_tree.get_root_hash(), count)
+
+    def test_split_levels_round_trips(self):
+        for count in range(1, 20):
+            merkle_tree = MerkleTree([str(i) for i in range(count)])
+            nodes = b''.join(merkle_tree.levels)
+            self.assertEqual(MerkleTree.split_levels(nodes, count), merkle_tree.levels, count)
+
+
+class MerkleHashingTests(SimpleTestCase):
+    def setUp(self):
+        self.pairs = b''.join(sha256(str(i).encode()) for i in range(2 * merkle_hashing.PARALLEL_MIN_PAIRS + 3))
+
+    def test_hash_pairs_matches_hashlib(self):
+        expected = b''.join(
+            sha256(self.pairs[offset:offset + merkle_hashing.PAIR_SIZE])
+            for offset in range(0, len(self.pairs) - merkle_hashing.PAIR_SIZE + 1, merkle_hashing.PAIR_SIZE)
+        )
+        with mock.patch.object(merkle_hashing, '_hashtree', None):
+            self.assertEqual(merkle_hashing.hash_pairs(self.pairs), expected)
+            self.assertEqual(merkle_hashing.hash_pairs(bytearray(self.pairs)), expected)
+
+    @skipIf(merkle_hashing._hashtree is None, 'libhashtree is not available')
+    def test_hashtree_matches_hashlib(self):
+        with mock.patch.object(merkle_hashing, '_hashtree', None):
+            expected = merkle_hashing.build_levels(bytearray(self.pairs))
+
+        self.assertEqual(merkle_hashing.build_levels(bytearray(self.pairs)), expected)
+        # Large levels are sharded across the pool, small ones hashed in one call
+        self.assertEqual(merkle_hashing.hash_pairs(self.pairs), expected[1][:-merkle_hashing.DIGEST_SIZE])
+
+
+class DonationLeafTests(SimpleTestCase):
+    def setUp(self):
+        self.row = (1, '0x' + 'ab' * 20, Decimal('0.1'), timezone.now(), '0x' + 'cd' * 32)
+
+    def test_leaf_is_tagged_and_never_pair_sized(self):
+        leaf_bytes = DonationMerkleTree._leaf_bytes(self.row)
+
+        self.assertEqual(leaf_bytes[0], merkle_utils.LEAF_TAG)
+        self.assertNotEqual(len(leaf_bytes), merkle_hashing.PAIR_SIZE)
+        self.assertEqual(DonationMerkleTree([self.row])._node(0, 0), sha256(leaf_bytes))
+
+    def test_largest_amounts_pack(self):
+        for amount in (Decimal('92233720368.54775808'), Decimal('999999999999.99999999'), Decimal('-1')):
+            row = self.row[:2] + (amount,) + self.row[3:]
+            self.assertEqual(len(DonationMerkleTree._leaf_bytes(row)), merkle_utils.DONATION_LEAF_STRUCT.size)
+
+    def test_malformed_hex_fields_pack(self):
+        row = (1, 'not-an-address', Decimal('1'), timezone.now(), '0x12')
+        self.assertEqual(len(DonationMerkleTree._leaf_bytes(row)), merkle_utils.DONATION_LEAF_STRUCT.size)
+
+
+class DonationProofTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        creator = UserProfile.objects.create(
+            wallet_address='0x' + 'a' * 40,
+            name='Creator',
+            email='creator@example.com',
+            profile_type='charity'
+        )
+        self.charity = Charity.objects.create(
+            name='Charity',
+            description='Description',
+            wallet_address='0x' + 'b' * 40,
+            target_amount=Decimal('10'),
+            category='Other',
+            creator_name='Creator',
+            creator_email='creator@example.com',
+            creator_wallet=creator
+        )
+        self.donations_added = 0
+
+    def add_donations(self, count: int):
+        for _ in range(count):
+            index = self.donations_added
+            self.donations_added += 1
+            Donation.objects.create(
+                charity=self.charity,
+                donor_address=f'0x{index:040x}',
+                amount=Decimal('0.1'),
+                tx_hash=f'0x{index:064x}',
+                confirmed=True
+            )
+
+    def full_tree(self) -> DonationMerkleTree:
+        return DonationMerkleTree(list(
+            Donation.objects.filter(charity=self.charity, confirmed=True)
+            .order_by(*merkle_utils.DONATION_LEAF_ORDER)
+            .values_list(*DONATION_LEAF_FIELDS)
+        ))
+
+    def assert_proofs_match_full_tree(self):
+        full_tree = self.full_tree()
+        for donation_id in full_tree.donation_ids:
+            result = get_donation_proof(self.charity.id, donation_id)
+            expected = full_tree.generate_donation_proof(donation_id)
+
+            self.assertEqual(result['merkle_proof']['proof'], expected.proof, donation_id)
+            self.assertEqual(result['merkle_proof']['leaf'], expected.leaf, donation_id)
+            self.assertEqual(result['merkle_proof']['root'], expected.root, donation_id)
+            self.assertEqual(result['merkle_proof']['index'], expected.index, donation_id)
+            self.assertEqual(result['tree_info']['tree_depth'], len(full_tree.levels), donation_id)
+            self.assertTrue(verify_donation_inclusion(self.charity.id, result['merkle_proof'])['verified'])
+
+        self.assertEqual(get_donation_merkle_info(self.charity.id)['root_hash'], full_tree.get_root_hash())
+
+    def test_proofs_across_epoch_boundaries_match_full_tree(self):
+        for epoch_size in (1, 2, 4):
+            with self.subTest(epoch_size=epoch_size), \
+                    mock.patch.object(merkle_utils, 'EPOCH_SIZE', epoch_size), \
+                    mock.patch.object(merkle_utils, 'EPOCH_DEPTH', epoch_size.bit_length() - 1):
+                Donation.objects.all().delete()
+                merkle_utils.DonationEpoch.objects.all().delete()
+                for count in (1, 3, 4, 5, 9):
+                    self.add_donations(count - Donation.objects.count())
+                    self.assert_proofs_match_full_tree()
+
+    def test_large_recorded_amount_keeps_proofs_working(self):
+        client = APIClient()
+        for index, amount in enumerate(('100000000000', '92233720368.54775808')):
+            response = client.post('/api/donations/', {
+                'charity_id': self.charity.id,
+                'donor_address': '0x' + 'c' * 40,
+                'amount': amount,
+                'tx_hash': f'0x{index:064x}'
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+
+            proof = client.get(f"/api/donations/{response.data['id']}/merkle-proof/")
+            self.assertEqual(proof.status_code, 200, proof.data)
+
+        self.assertNotIn('error', get_donation_merkle_info(self.charity.id))
+        self.assert_proofs_match_full_tree()
+
+    def test_appended_donations_match_rebuild(self):
+        for _ in range(6):
+            self.add_donations(1)
+            merkle_utils.append_donation_to_merkle_tree(Donation.objects.order_by('-id').first())
+
+        stored = merkle_utils.CachedDonationMerkleTree.from_stored(self.charity.merkle_tree_cache)
+        full_tree = self.full_tree()
+        self.assertEqual(stored.levels, full_tree.levels)
+        self.assertEqual(stored.donation_ids, full_tree.donation_ids)
+
+    def store_tree(self, count: int):
+        self.add_donations(count)
+        merkle_utils.append_donation_to_merkle_tree(Donation.objects.order_by('-id').first())
+        return self.charity.merkle_layer
+
+    def test_cached_layer_rejects_internal_node_as_leaf(self):
+        layer = self.store_tree(40)
+        self.assertGreater(layer.level, 0)
+
+        full_tree = self.full_tree()
+        index = 1 << layer.level
+        forged = {
+            'proof': [None] * layer.level + full_tree.generate_proof(index).proof[layer.level:],
+            'leaf': full_tree._node(layer.level, 1).hex(),
+            'root': full_tree.get_root_hash(),
+            'index': index
+        }
+        result = verify_donation_inclusion(self.charity.id, forged)
+
+        self.assertEqual(result['tree_info']['verified_to_level'], layer.level)
+        self.assertFalse(result['verified'])
+
+    def test_cached_layer_goes_stale_after_delete_and_insert(self):
+        self.store_tree(10)
+        Donation.objects.order_by('id').first().delete()
+        self.add_donations(1)
+
+        proof = self.full_tree().generate_donation_proof(Donation.objects.order_by('-id').first().id)
+        verification = verify_donation_inclusion(self.charity.id, asdict(proof))
+
+        self.assertNotIn('verified_to_level', verification['tree_info'])
+        self.assertTrue(verification['verified'])
+
+    def test_leaf_preview_only_with_debug(self):
+        self.add_donations(7)
+        donation_id = Donation.objects.order_by('-id').first().id
+        client = APIClient()
+
+        with mock.patch.object(DonationMerkleTree, '_hash_leaves', wraps=DonationMerkleTree._hash_leaves) as hash_leaves:
+            response = client.get(f'/api/donations/{donation_id}/merkle-proof/')
+            hashed = sum(len(call.args[0]) for call in hash_leaves.call_args_list)
+        self.assertNotIn('leaves', response.data['tree_info'])
+        self.assertEqual(hashed, 7)
+
+        response = client.get(f'/api/donations/{donation_id}/merkle-proof/?debug=1')
+        self.assertEqual(response.data['tree_info']['leaves'], self.full_tree().get_tree_info()['leaves'])
+
+    def test_stale_sealed_epochs_are_resealed(self):
+        with mock.patch.object(merkle_utils, 'EPOCH_SIZE', 4), mock.patch.object(merkle_utils, 'EPOCH_DEPTH', 2):
+            self.add_donations(10)
+            self.assert_proofs_match_full_tree()
+            self.assertEqual(merkle_utils.DonationEpoch.objects.count(), 2)
+
+            Donation.objects.order_by('id')[1].delete()
+            self.add_donations(1)
+            self.assert_proofs_match_full_tree()
+
+    def test_open_epoch_proofs_reuse_stored_tree(self):
+        self.store_tree(30)
+        donation_ids = list(Donation.objects.values_list('id', flat=True)[:5])
+
+        with mock.patch.object(DonationMerkleTree, '_hash_leaves', wraps=DonationMerkleTree._hash_leaves) as hash_leaves:
+            for donation_id in donation_ids:
+                self.assertNotIn('error', get_donation_proof(self.charity.id, donation_id))
+        self.assertFalse(hash_leaves.called)
+        self.assert_proofs_match_full_tree()
+
+    def test_merkle_info_hashes_no_leaves_once_stored(self):
+        self.store_tree(30)
+        expected = self.full_tree().get_root_hash()
+
+        with mock.patch.object(DonationMerkleTree, '_hash_leaves', wraps=DonationMerkleTree._hash_leaves) as hash_leaves:
+            for _ in range(3):
+                self.assertEqual(get_donation_merkle_info(self.charity.id)['root_hash'], expected)
+        self.assertFalse(hash_leaves.called)
+
+        # Without a stored tree the root is computed from the leaves
+        cache.clear()
+        merkle_utils.CharityMerkleLayer.objects.all().delete()
+        self.assertEqual(get_donation_merkle_info(self.charity.id)['root_hash'], expected)
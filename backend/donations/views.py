@@ -1,16 +1,31 @@
+import logging
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from .models import Donation
 from .serializers import DonationSerializer, DonationCreateSerializer
 from charities.models import Charity
 from .merkle_utils import (
-    create_charity_merkle_tree, 
+    get_donation_proof,
+    get_donation_leaf_preview,
     verify_donation_inclusion,
-    get_donation_merkle_info
+    get_donation_merkle_info,
+    append_donation_to_merkle_tree
 )
 
+logger = logging.getLogger(__name__)
+
+# Tree info fields returned unless the request asks for ?debug=1
+TREE_INFO_SUMMARY_FIELDS = ('root_hash', 'tree_depth', 'total_leaves')
+
+def _tree_info_response(request, tree_info):
+    """Trim tree info to its summary fields unless debugging"""
+    if tree_info is None or request.GET.get('debug') == '1':
+        return tree_info
+    return {key: tree_info[key] for key in TREE_INFO_SUMMARY_FIELDS if key in tree_info}
+
 @api_view(['POST'])
 def record_donation(request):
     """Record a new donation"""
@@ -25,26 +40,25 @@ def record_donation(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if donation with this tx_hash already exists
-        if Donation.objects.filter(tx_hash=serializer.validated_data['tx_hash']).exists():
+        # Create donation; the unique tx_hash constraint rejects duplicates and
+        # Donation.save adds the amount to the charity in the same transaction
+        try:
+            with transaction.atomic():
+                donation = Donation.objects.create(
+                    charity=charity,
+                    donor_address=serializer.validated_data['donor_address'],
+                    amount=serializer.validated_data['amount'],
+                    tx_hash=serializer.validated_data['tx_hash'],
+                    confirmed=True,  # For simplicity, we'll mark as confirmed immediately
+                    confirmed_at=timezone.now()
+                )
+        except IntegrityError:
             return Response(
                 {'error': 'Donation with this transaction hash already exists'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create donation
-        donation = Donation.objects.create(
-            charity=charity,
-            donor_address=serializer.validated_data['donor_address'],
-            amount=serializer.validated_data['amount'],
-            tx_hash=serializer.validated_data['tx_hash'],
-            confirmed=True,  # For simplicity, we'll mark as confirmed immediately
-            confirmed_at=timezone.now()
-        )
-        
-        # Update charity raised amount
-        charity.raised_amount += donation.amount
-        charity.save()
+        append_donation_to_merkle_tree(donation)
         
         response_serializer = DonationSerializer(donation)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -57,7 +71,8 @@ def list_donations(request):
     charity_id = request.GET.get('charity_id')
     donor_address = request.GET.get('donor_address')
     
-    donations = Donation.objects.all()
+    # charity_name is read per row by the serializer
+    donations = Donation.objects.select_related('charity')
     
     if charity_id:
         donations = donations.filter(charity_id=charity_id)
@@ -86,34 +101,26 @@ def get_merkle_proof(request, donation_id):
     """Generate Merkle proof for a specific donation"""
     try:
         donation = Donation.objects.get(id=donation_id, confirmed=True)
-        charity_id = donation.charity.id
+        charity_id = donation.charity_id
         
-        # Create Merkle tree for the charity
-        merkle_tree = create_charity_merkle_tree(charity_id)
-        if not merkle_tree:
+        # Generate (or reuse) the proof for this donation
+        proof_data = get_donation_proof(charity_id, donation_id)
+        if 'error' in proof_data:
             return Response(
-                {'error': 'No confirmed donations found for this charity'}, 
+                {'error': proof_data['error']}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Generate proof for this donation
-        proof = merkle_tree.generate_donation_proof(donation_id)
-        if not proof:
-            return Response(
-                {'error': 'Donation not found in Merkle tree'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+        tree_info = proof_data['tree_info']
+        if request.GET.get('debug') == '1':
+            # Leaf preview is only hashed on request, never cached with the proof
+            tree_info = {**tree_info, 'leaves': get_donation_leaf_preview(charity_id)}
         
         return Response({
             'donation_id': donation_id,
             'charity_id': charity_id,
-            'merkle_proof': {
-                'proof': proof.proof,
-                'leaf': proof.leaf,
-                'root': proof.root,
-                'index': proof.index
-            },
-            'tree_info': merkle_tree.get_tree_info(),
+            'merkle_proof': proof_data['merkle_proof'],
+            'tree_info': _tree_info_response(request, tree_info),
             'donation_details': {
                 'donor_address': donation.donor_address,
                 'amount': str(donation.amount),
@@ -152,6 +159,10 @@ def verify_merkle_proof(request):
         verification_result = verify_donation_inclusion(
             charity_id, proof_data
         )
+        if 'tree_info' in verification_result:
+            verification_result['tree_info'] = _tree_info_response(
+                request, verification_result['tree_info']
+            )
         
         return Response({
             'verification_result': verification_result,
@@ -161,7 +172,7 @@ def verify_merkle_proof(request):
         })
         
     except Exception as e:
-        print(f"Error verifying Merkle proof: {str(e)}")
+        logger.exception("Error verifying Merkle proof")
         return Response(
             {'error': f'Verification failed: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
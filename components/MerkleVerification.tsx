@@ -246,13 +246,13 @@ export function MerkleVerification({ donationId, charityId, onClose }: MerkleVer
             <div className="space-y-2">
               <Label>Proof Path (Sibling Hashes)</Label>
               <div className="space-y-1">
-                {proof.merkle_proof.proof.map((hash: string, index: number) => (
+                {proof.merkle_proof.proof.map((hash: string | null, index: number) => (
                   <div key={index} className="flex items-center gap-2">
                     <Badge variant="outline" className="text-xs">
                       Level {index + 1}
                     </Badge>
                     <code className="text-xs bg-muted px-2 py-1 rounded flex-1 break-all">
-                      {hash}
+                      {hash ?? 'No sibling (node promoted unchanged)'}
                     </code>
                   </div>
                 ))}